@@ -0,0 +1,54 @@
+from pymongo import MongoClient, UpdateOne
+import os
+import sys
+from dotenv import load_dotenv
+from models import content_fields
+
+load_dotenv()
+
+
+MONGODB_URI = os.getenv("MONGODB_URI")
+BATCH_SIZE = 500
+
+client = MongoClient(MONGODB_URI)
+db = client["news-portal"]
+news_collection = db["news"]
+
+
+def backfill_content(batch_size=BATCH_SIZE):
+    """Compress legacy plain-text article bodies and precompute excerpts"""
+    print("Backfilling compressed news content...")
+
+    query = {"content": {"$type": "string"}}
+    cursor = news_collection.find(query, {"content": 1}, batch_size=batch_size)
+
+    migrated = 0
+    operations = []
+    for doc in cursor:
+        operations.append(UpdateOne(
+            {"_id": doc["_id"], "content": doc["content"]},
+            {"$set": content_fields(doc["content"]), "$unset": {"content": ""}},
+        ))
+        if len(operations) >= batch_size:
+            migrated += news_collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+            print(f"  {migrated} articles migrated")
+
+    if operations:
+        migrated += news_collection.bulk_write(operations, ordered=False).modified_count
+
+    print(f"✓ Migrated {migrated} news articles")
+    return migrated
+
+
+def main():
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else BATCH_SIZE
+    try:
+        backfill_content(batch_size)
+    except Exception as e:
+        print(f"\n Error backfilling content: {str(e)}")
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    main()
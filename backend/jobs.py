@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from mongoengine import Q
+
+from models import Job, News, Comment
+
+
+logger = logging.getLogger(__name__)
+
+JOB_LOCK_SECONDS = 300
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_BACKOFF_SECONDS = 300
+CASCADE_DELETE_BATCH_SIZE = 500
+
+job_handlers: Dict[str, Callable[[dict, Callable[[], None]], None]] = {}
+
+
+class JobLockLost(Exception):
+    pass
+
+
+def job_handler(kind: str):
+    def register(func):
+        job_handlers[kind] = func
+        return func
+    return register
+
+
+def enqueue_job(kind: str, payload: dict, max_attempts: int = 5) -> Job:
+    if kind not in job_handlers:
+        raise ValueError(f"No handler registered for job kind {kind!r}")
+    return Job(kind=kind, payload=payload, max_attempts=max_attempts).save()
+
+
+def claim_job() -> Optional[Job]:
+    """Atomically take the next due job, including running jobs whose lock has expired."""
+    now = datetime.utcnow()
+    return Job.objects(
+        Q(status="pending", run_at__lte=now) | Q(status="running", locked_until__lt=now)
+    ).order_by("run_at").modify(
+        set__status="running",
+        set__locked_until=now + timedelta(seconds=JOB_LOCK_SECONDS),
+        inc__attempts=1,
+        new=True,
+    )
+
+
+def owned_job(job: Job):
+    """Query matching the job only while this claim still holds it; a reclaim bumps attempts."""
+    return Job.objects(id=job.id, status="running", attempts=job.attempts)
+
+
+def make_heartbeat(job: Job) -> Callable[[], None]:
+    def heartbeat():
+        renewed = owned_job(job).update_one(
+            set__locked_until=datetime.utcnow() + timedelta(seconds=JOB_LOCK_SECONDS),
+        )
+        if not renewed:
+            raise JobLockLost(f"Job {job.id} was reclaimed by another worker")
+    return heartbeat
+
+
+def run_job(job: Job):
+    if job.attempts > job.max_attempts:
+        # reclaimed after its lock expired, i.e. the last attempt crashed or hung the worker
+        owned_job(job).update_one(
+            set__status="failed",
+            set__last_error=job.last_error or "Lock expired on final attempt",
+            set__locked_until=None,
+            set__finished_at=datetime.utcnow(),
+        )
+        return
+
+    try:
+        job_handlers[job.kind](job.payload, make_heartbeat(job))
+    except JobLockLost:
+        logger.warning("Job %s (%s) lost its lock, leaving it to the new owner", job.id, job.kind)
+        return
+    except Exception as e:
+        logger.exception("Job %s (%s) failed on attempt %s", job.id, job.kind, job.attempts)
+        if job.attempts >= job.max_attempts:
+            owned_job(job).update_one(
+                set__status="failed",
+                set__last_error=str(e),
+                set__locked_until=None,
+                set__finished_at=datetime.utcnow(),
+            )
+        else:
+            backoff = min(2 ** job.attempts, JOB_MAX_BACKOFF_SECONDS)
+            owned_job(job).update_one(
+                set__status="pending",
+                set__last_error=str(e),
+                set__locked_until=None,
+                set__run_at=datetime.utcnow() + timedelta(seconds=backoff),
+            )
+        return
+
+    owned_job(job).update_one(
+        set__status="done",
+        set__locked_until=None,
+        set__finished_at=datetime.utcnow(),
+    )
+
+
+async def run_worker(stop: asyncio.Event, poll_interval: float = JOB_POLL_INTERVAL):
+    while not stop.is_set():
+        try:
+            job = await asyncio.to_thread(claim_job)
+            if job is not None:
+                await asyncio.to_thread(run_job, job)
+                continue
+        except Exception:
+            logger.exception("Job worker error")
+
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+@job_handler("cascade_delete_news")
+def cascade_delete_news(payload: dict, heartbeat: Callable[[], None]):
+    """Delete comments of a soft-deleted article in batches, then the article itself.
+
+    Every step is idempotent, so a retried job simply picks up where the last attempt stopped.
+    """
+    news_id = payload["news_id"]
+    news = News.objects(id=news_id).only("id", "deleted_at").first()
+    if news is None:
+        return
+    if news.deleted_at is None:
+        # the job is enqueued before the soft delete is written; retry until it lands
+        raise RuntimeError(f"News {news_id} is not marked deleted yet")
+
+    comment_query = Q(news=news.id) | Q(news_id=str(news.id))
+    while True:
+        batch = [
+            comment.id for comment in
+            Comment.objects(comment_query).only("id").limit(CASCADE_DELETE_BATCH_SIZE)
+        ]
+        if not batch:
+            break
+        Comment.objects(id__in=batch).delete()
+        heartbeat()
+
+    News.objects(id=news.id).delete()
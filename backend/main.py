@@ -1,13 +1,14 @@
-from fastapi import FastAPI, Depends, status, Request
+from fastapi import FastAPI, Depends, status, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from mongoengine import connect
 from bson import ObjectId
 from bson.errors import InvalidId
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
+import asyncio
 import jwt
 import os
 from dotenv import load_dotenv
@@ -18,7 +19,9 @@ from exceptions import (
     UnauthorizedException,
     ForbiddenException,
 )
-from models import User, News, Comment
+from models import User, News, Comment, content_fields
+from jobs import enqueue_job, run_worker
+from rate_limit import RateLimitMiddleware, RouteLimit, RateLimit
 
 
 load_dotenv()
@@ -27,6 +30,47 @@ app = FastAPI()
 register_exception_handlers(app)
 
 
+MONGODB_URI = os.getenv("MONGODB_URI")
+SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", "64"))
+
+
+def rate_limit_user_id(headers: dict) -> Optional[str]:
+    auth_header = headers.get("authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        return None
+    try:
+        payload = jwt.decode(auth_header.split(" ")[1], SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        return None
+    return payload.get("sub")
+
+
+rate_limited_routes = [
+    RouteLimit("POST", "/login", per_ip=RateLimit(capacity=5, refill_rate=5 / 60)),
+    RouteLimit("POST", "/register", per_ip=RateLimit(capacity=3, refill_rate=3 / 60)),
+    RouteLimit("GET", "/news", per_ip=RateLimit(capacity=30, refill_rate=10)),
+    RouteLimit("GET", "/news/{news_id}", per_ip=RateLimit(capacity=30, refill_rate=10)),
+    RouteLimit("GET", "/news/{news_id}/comments", per_ip=RateLimit(capacity=30, refill_rate=10)),
+    RouteLimit("POST", "/news", per_ip=RateLimit(capacity=10, refill_rate=1), per_user=RateLimit(capacity=5, refill_rate=5 / 60)),
+    RouteLimit("PATCH", "/news/{news_id}", per_ip=RateLimit(capacity=20, refill_rate=20 / 60), per_user=RateLimit(capacity=10, refill_rate=10 / 60)),
+    RouteLimit("DELETE", "/news/{news_id}", per_ip=RateLimit(capacity=20, refill_rate=20 / 60), per_user=RateLimit(capacity=10, refill_rate=10 / 60)),
+    RouteLimit("POST", "/news/{news_id}/comments", per_ip=RateLimit(capacity=20, refill_rate=1), per_user=RateLimit(capacity=10, refill_rate=10 / 60)),
+    RouteLimit("DELETE", "/comments/{comment_id}", per_ip=RateLimit(capacity=40, refill_rate=40 / 60), per_user=RateLimit(capacity=20, refill_rate=20 / 60)),
+]
+
+
+# Registered before CORS so it runs inside it and 429/503 responses still carry CORS headers.
+app.add_middleware(
+    RateLimitMiddleware,
+    routes = rate_limited_routes,
+    identify_user = rate_limit_user_id,
+    max_in_flight = MAX_IN_FLIGHT_REQUESTS,
+)
+
+
 origins = [
     "http://localhost:5173",
     "http://localhost:3000",
@@ -38,15 +82,28 @@ app.add_middleware(
     allow_credentials = True, 
     allow_methods = ["*"],
     allow_headers = ["*"],
+    expose_headers = ["Retry-After"],
 )
 
+connect(db="news-portal", host=MONGODB_URI)
 
-MONGODB_URI = os.getenv("MONGODB_URI")
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-connect(db="news-portal", host=MONGODB_URI)
+job_worker_stop = asyncio.Event()
+job_worker_task = None
+
+
+@app.on_event("startup")
+async def start_job_worker():
+    global job_worker_task
+    job_worker_stop.clear()
+    job_worker_task = asyncio.create_task(run_worker(job_worker_stop))
+
+
+@app.on_event("shutdown")
+async def stop_job_worker():
+    job_worker_stop.set()
+    if job_worker_task is not None:
+        await job_worker_task
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -91,6 +148,8 @@ class NewsResponse(BaseModel):
     id: str
     title: str
     content: str
+    excerpt: Optional[str]
+    word_count: Optional[int]
     category: str
     image_url: Optional[str]
     author_id: str
@@ -154,6 +213,89 @@ def resolve_comment_user(comment: Comment) -> Optional[User]:
             return None
     return None
 
+
+# Response field -> document fields it is built from. Used to turn ?fields= into a Mongo projection.
+NEWS_FIELD_SOURCES = {
+    "id": [],
+    "title": ["title"],
+    "content": ["content_compressed", "content"],
+    "excerpt": ["excerpt", "content"],
+    "word_count": ["word_count", "content"],
+    "category": ["category"],
+    "image_url": ["image_url"],
+    "author_id": ["author", "author_id"],
+    "author": ["author", "author_id"],
+    "created_at": ["created_at"],
+    "updated_at": ["updated_at"],
+}
+
+COMMENT_FIELD_SOURCES = {
+    "id": [],
+    "news_id": [],
+    "user_id": ["user", "user_id"],
+    "username": ["username"],
+    "full_name": ["full_name"],
+    "text": ["text"],
+    "created_at": ["created_at"],
+}
+
+
+def parse_fields(fields: Optional[str], field_sources: dict) -> List[str]:
+    if not fields:
+        return list(field_sources)
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in field_sources]
+    if unknown:
+        raise BadRequestException(f"Unknown fields: {', '.join(unknown)}")
+
+    # id is always returned so clients can link to the full object
+    return ["id"] + [field for field in field_sources if field in requested and field != "id"]
+
+
+def projection_for(requested: List[str], field_sources: dict, *always: str) -> List[str]:
+    projection = {"id", *always}
+    for field in requested:
+        projection.update(field_sources[field])
+    return sorted(projection)
+
+
+def serialize_news(news: News, requested: List[str]) -> dict:
+    author = resolve_news_author(news) if {"author", "author_id"} & set(requested) else None
+    values = {
+        "id": lambda: str(news.id),
+        "title": lambda: news.title,
+        "content": lambda: news.get_content(),
+        "excerpt": lambda: news.get_excerpt(),
+        "word_count": lambda: news.get_word_count(),
+        "category": lambda: news.category or "General",
+        "image_url": lambda: news.image_url,
+        "author_id": lambda: str(author.id) if author else (str(news.author_id) if getattr(news, "author_id", None) else None),
+        "author": lambda: {
+            "id": str(author.id),
+            "username": author.username,
+            "full_name": author.full_name,
+        } if author else None,
+        "created_at": lambda: news.created_at.isoformat(),
+        "updated_at": lambda: news.updated_at.isoformat(),
+    }
+    return {field: values[field]() for field in requested}
+
+
+def serialize_comment(comment: Comment, news_id: str, requested: List[str]) -> dict:
+    comment_user = resolve_comment_user(comment) if "user_id" in requested else None
+    values = {
+        "id": lambda: str(comment.id),
+        "news_id": lambda: news_id,
+        "user_id": lambda: str(comment_user.id) if comment_user else (str(comment.user_id) if getattr(comment, "user_id", None) else None),
+        "username": lambda: comment.username,
+        "full_name": lambda: comment.full_name,
+        "text": lambda: comment.text,
+        "created_at": lambda: comment.created_at.isoformat(),
+    }
+    return {field: values[field]() for field in requested}
+
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
@@ -245,63 +387,34 @@ def get_current_user_info(current_user: User = Depends(get_current_user)):
 
 
 @app.get("/news")
-def get_news():
-    news_list = []
-    for news in News.objects.order_by("-created_at").select_related(max_depth=1):
-        author = resolve_news_author(news)
-        news_list.append({
-            "id": str(news.id),
-            "title": news.title,
-            "content": news.content,
-            "category": news.category or "General",
-            "image_url": news.image_url,
-            "author_id": str(author.id) if author else (str(news.author_id) if getattr(news, "author_id", None) else None),
-            "author": {
-                "id": str(author.id),
-                "username": author.username,
-                "full_name": author.full_name,
-            } if author else None,
-            "created_at": news.created_at.isoformat(),
-            "updated_at": news.updated_at.isoformat(),
-        })
-    return news_list
+def get_news(fields: Optional[str] = Query(None, description="Comma-separated list of fields to return")):
+    requested = parse_fields(fields, NEWS_FIELD_SOURCES)
+    queryset = News.live.only(*projection_for(requested, NEWS_FIELD_SOURCES)).order_by("-created_at")
+    if "author" in requested or "author_id" in requested:
+        queryset = queryset.select_related(max_depth=1)
+    return [serialize_news(news, requested) for news in queryset]
 
 @app.get("/news/{news_id}")
-def get_news_by_id(news_id: str):
+def get_news_by_id(news_id: str, fields: Optional[str] = Query(None, description="Comma-separated list of fields to return")):
+    requested = parse_fields(fields, NEWS_FIELD_SOURCES)
     object_id = parse_object_id(news_id, "news")
-    news = News.objects(id=object_id).first()
+    news = News.live(id=object_id).only(*projection_for(requested, NEWS_FIELD_SOURCES)).first()
     if not news:
         raise ObjectNotFoundException("News not found")
 
-    author = resolve_news_author(news)
-
-    return {
-        "id": str(news.id),
-        "title": news.title,
-        "content": news.content,
-        "category": news.category or "General",
-        "image_url": news.image_url,
-        "author_id": str(author.id) if author else (str(news.author_id) if getattr(news, "author_id", None) else None),
-        "author": {
-            "id": str(author.id),
-            "username": author.username,
-            "full_name": author.full_name,
-        } if author else None,
-        "created_at": news.created_at.isoformat(),
-        "updated_at": news.updated_at.isoformat(),
-    }
+    return serialize_news(news, requested)
 
 @app.post("/news", status_code=status.HTTP_201_CREATED)
 def create_news(news: NewsCreate, current_user: User = Depends(get_current_user)):
     created_news = News(
         title=news.title,
-        content=news.content,
         category=news.category,
         image_url=news.image_url,
         author=current_user,
         author_id=str(current_user.id),
         created_at=datetime.utcnow(),
         updated_at=datetime.utcnow(),
+        **content_fields(news.content),
     ).save()
     
     return {
@@ -312,7 +425,7 @@ def create_news(news: NewsCreate, current_user: User = Depends(get_current_user)
 @app.patch("/news/{news_id}")
 def update_news(news_id: str, news: NewsUpdate, current_user: User = Depends(get_current_user)):
     object_id = parse_object_id(news_id, "news")
-    existing_news = News.objects(id=object_id).first()
+    existing_news = News.live(id=object_id).first()
     if not existing_news:
         raise ObjectNotFoundException("News not found")
 
@@ -323,6 +436,9 @@ def update_news(news_id: str, news: NewsUpdate, current_user: User = Depends(get
 
     update_data = news.dict(exclude_none=True)
     if update_data:
+        content = update_data.pop("content", None)
+        if content is not None:
+            existing_news.set_content(content)
         for key, value in update_data.items():
             setattr(existing_news, key, value)
         existing_news.updated_at = datetime.utcnow()
@@ -333,7 +449,7 @@ def update_news(news_id: str, news: NewsUpdate, current_user: User = Depends(get
 @app.delete("/news/{news_id}")
 def delete_news(news_id: str, current_user: User = Depends(get_current_user)):
     object_id = parse_object_id(news_id, "news")
-    existing_news = News.objects(id=object_id).first()
+    existing_news = News.live(id=object_id).first()
     if not existing_news:
         raise ObjectNotFoundException("News not found")
 
@@ -342,9 +458,9 @@ def delete_news(news_id: str, current_user: User = Depends(get_current_user)):
     if existing_author_id != str(current_user.id):
         raise ForbiddenException("Not authorized to delete this news")
 
-    Comment.objects(news=existing_news).delete()
-    Comment.objects(news_id=str(existing_news.id)).delete()
-    existing_news.delete()
+    # enqueue first: if the soft delete below never lands the job just fails, instead of hiding the article forever
+    enqueue_job("cascade_delete_news", {"news_id": str(existing_news.id)})
+    News.objects(id=existing_news.id).update_one(set__deleted_at=datetime.utcnow())
     return {"message": "News deleted successfully"}
 
 
@@ -352,7 +468,7 @@ def delete_news(news_id: str, current_user: User = Depends(get_current_user)):
 @app.post("/news/{news_id}/comments", status_code=status.HTTP_201_CREATED)
 def create_comment(news_id: str, comment: CommentCreate, current_user: User = Depends(get_current_user)):
     news_object_id = parse_object_id(news_id, "news")
-    news = News.objects(id=news_object_id).first()
+    news = News.live(id=news_object_id).first()
     if not news:
         raise ObjectNotFoundException("News not found")
 
@@ -383,15 +499,17 @@ def create_comment(news_id: str, comment: CommentCreate, current_user: User = De
 
 
 @app.get("/news/{news_id}/comments")
-def get_news_comments(news_id: str):
+def get_news_comments(news_id: str, fields: Optional[str] = Query(None, description="Comma-separated list of fields to return")):
+    requested = parse_fields(fields, COMMENT_FIELD_SOURCES)
     news_object_id = parse_object_id(news_id, "news")
-    news = News.objects(id=news_object_id).first()
+    news = News.live(id=news_object_id).only("id").first()
     if not news:
         raise ObjectNotFoundException("News not found")
 
-    comments = []
-    comments_qs = Comment.objects(news=news).order_by("-created_at")
-    legacy_comments_qs = Comment.objects(news_id=str(news.id)).order_by("-created_at")
+    # created_at is always loaded because the merged result is sorted on it
+    projection = projection_for(requested, COMMENT_FIELD_SOURCES, "created_at")
+    comments_qs = Comment.objects(news=news).only(*projection).order_by("-created_at")
+    legacy_comments_qs = Comment.objects(news_id=str(news.id)).only(*projection).order_by("-created_at")
 
     merged = {}
     for comment in comments_qs:
@@ -405,18 +523,7 @@ def get_news_comments(news_id: str):
         reverse=True,
     )
 
-    for comment in sorted_comments:
-        comment_user = resolve_comment_user(comment)
-        user_id = str(comment_user.id) if comment_user else (str(comment.user_id) if getattr(comment, "user_id", None) else None)
-        comments.append({
-            "id": str(comment.id),
-            "news_id": str(news.id),
-            "user_id": user_id,
-            "username": comment.username,
-            "full_name": comment.full_name,
-            "text": comment.text,
-            "created_at": comment.created_at.isoformat(),
-        })
+    comments = [serialize_comment(comment, str(news.id), requested) for comment in sorted_comments]
 
     return {
         "news_id": news_id,
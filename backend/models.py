@@ -1,15 +1,48 @@
+import zlib
 from datetime import datetime
 
 from mongoengine import (
+    BinaryField,
     DateTimeField,
+    DictField,
     EmailField,
+    IntField,
     ReferenceField,
     StringField,
     CASCADE,
     Document,
+    queryset_manager,
 )
 
 
+EXCERPT_LENGTH = 200
+
+
+def compress_content(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 9)
+
+
+def decompress_content(data: bytes) -> str:
+    return zlib.decompress(data).decode("utf-8")
+
+
+def make_excerpt(text: str, length: int = EXCERPT_LENGTH) -> str:
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(" ", 1)[0]
+    return cut.rstrip(".,;:!?") + "..."
+
+
+def content_fields(text: str) -> dict:
+    """Stored representation of an article body: compressed bytes plus precomputed excerpt and word count."""
+    return {
+        "content_compressed": compress_content(text),
+        "excerpt": make_excerpt(text),
+        "word_count": len(text.split()),
+    }
+
+
 class User(Document):
     username = StringField(required=True, unique=True)
     email = EmailField(required=True, unique=True)
@@ -25,20 +58,50 @@ class User(Document):
 
 class News(Document):
     title = StringField(required=True)
-    content = StringField(required=True)
+    # legacy plain-text body, kept readable until backfill_content.py has migrated the document
+    content = StringField(null=True)
+    content_compressed = BinaryField(null=True)
+    excerpt = StringField(null=True)
+    word_count = IntField(null=True)
     category = StringField(default="General")
     image_url = StringField(null=True)
     author = ReferenceField(User, required=False, null=True, reverse_delete_rule=CASCADE)
     author_id = StringField(null=True)
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
+    # set when the article is deleted; comments are removed later by the job queue
+    deleted_at = DateTimeField(null=True)
 
     meta = {
         "collection": "news",
-        "indexes": ["-created_at", "author", "author_id"],
+        "indexes": ["-created_at", ("deleted_at", "-created_at"), "author", "author_id"],
         "strict": False,
     }
 
+    @queryset_manager
+    def live(doc_cls, queryset):
+        return queryset.filter(deleted_at=None)
+
+    def set_content(self, text: str):
+        for key, value in content_fields(text).items():
+            setattr(self, key, value)
+        self.content = None
+
+    def get_content(self):
+        if self.content_compressed:
+            return decompress_content(self.content_compressed)
+        return self.content
+
+    def get_excerpt(self):
+        if self.excerpt is not None:
+            return self.excerpt
+        return make_excerpt(self.content) if self.content else None
+
+    def get_word_count(self):
+        if self.word_count is not None:
+            return self.word_count
+        return len(self.content.split()) if self.content else None
+
 
 class Comment(Document):
     news = ReferenceField(News, required=False, null=True, reverse_delete_rule=CASCADE)
@@ -55,3 +118,25 @@ class Comment(Document):
         "indexes": ["news", "user", "news_id", "user_id", "-created_at"],
         "strict": False,
     }
+
+
+class Job(Document):
+    kind = StringField(required=True)
+    payload = DictField()
+    status = StringField(default="pending", choices=("pending", "running", "done", "failed"))
+    attempts = IntField(default=0)
+    max_attempts = IntField(default=5)
+    run_at = DateTimeField(default=datetime.utcnow)
+    locked_until = DateTimeField(null=True)
+    last_error = StringField(null=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+    finished_at = DateTimeField(null=True)
+
+    meta = {
+        "collection": "jobs",
+        "indexes": [
+            ("status", "run_at"),
+            ("status", "locked_until"),
+            {"fields": ["finished_at"], "expireAfterSeconds": 7 * 24 * 3600},
+        ],
+    }
@@ -0,0 +1,153 @@
+import json
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Token bucket settings: `capacity` tokens, refilled at `refill_rate` per second."""
+    capacity: float
+    refill_rate: float
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    method: str
+    path: str
+    per_ip: Optional[RateLimit] = None
+    per_user: Optional[RateLimit] = None
+
+    def compile(self):
+        # "/news/{news_id}/comments" -> ^/news/[^/]+/comments$
+        pattern = re.sub(r"\{[^/]+\}", "[^/]+", self.path)
+        return re.compile(f"^{pattern}$")
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated_at = now
+
+    def consume(self, limit: RateLimit, now: float) -> float:
+        """Take one token. Returns 0 on success, otherwise seconds until a token is available."""
+        elapsed = now - self.updated_at
+        self.tokens = min(limit.capacity, self.tokens + elapsed * limit.refill_rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / limit.refill_rate
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying per-route token buckets and a global in-flight cap.
+
+    Buckets are keyed by (route, client ip) and, when `identify_user` returns an id,
+    by (route, user id). A bucket that has been idle long enough to refill completely
+    is indistinguishable from a new one, so the sweep simply drops it.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: List[RouteLimit],
+        identify_user: Optional[Callable[[Dict[str, str]], Optional[str]]] = None,
+        max_in_flight: Optional[int] = None,
+        shed_retry_after: int = 1,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.app = app
+        self.routes = [(route, route.compile()) for route in routes]
+        self.identify_user = identify_user
+        self.max_in_flight = max_in_flight
+        self.shed_retry_after = shed_retry_after
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.in_flight = 0
+        self.buckets: Dict[Tuple[str, str, str], Tuple[TokenBucket, RateLimit]] = {}
+        self.last_sweep = clock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            await self._reject(send, 503, "Server is busy, please retry later", self.shed_retry_after)
+            return
+
+        route = self._match_route(scope)
+        if route is not None:
+            retry_after = self._check_limits(route, scope)
+            if retry_after:
+                await self._reject(send, 429, "Too many requests", retry_after)
+                return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+    def _match_route(self, scope) -> Optional[RouteLimit]:
+        method = scope["method"]
+        path = scope["path"]
+        for route, pattern in self.routes:
+            if route.method == method and pattern.match(path):
+                return route
+        return None
+
+    def _check_limits(self, route: RouteLimit, scope) -> int:
+        now = self.clock()
+        if now - self.last_sweep >= self.sweep_interval:
+            self._sweep(now)
+
+        route_key = f"{route.method} {route.path}"
+        wait = 0.0
+        if route.per_ip is not None:
+            client = scope.get("client")
+            client_ip = client[0] if client else "unknown"
+            wait = max(wait, self._consume((route_key, "ip", client_ip), route.per_ip, now))
+
+        if route.per_user is not None and self.identify_user is not None:
+            headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+            user_id = self.identify_user(headers)
+            if user_id:
+                wait = max(wait, self._consume((route_key, "user", user_id), route.per_user, now))
+
+        return math.ceil(wait) if wait else 0
+
+    def _consume(self, key: Tuple[str, str, str], limit: RateLimit, now: float) -> float:
+        entry = self.buckets.get(key)
+        if entry is None:
+            entry = (TokenBucket(limit.capacity, now), limit)
+            self.buckets[key] = entry
+        return entry[0].consume(limit, now)
+
+    def _sweep(self, now: float):
+        expired = [
+            key for key, (bucket, limit) in self.buckets.items()
+            if bucket.tokens + (now - bucket.updated_at) * limit.refill_rate >= limit.capacity
+        ]
+        for key in expired:
+            del self.buckets[key]
+        self.last_sweep = now
+
+    async def _reject(self, send, status_code: int, detail: str, retry_after: int):
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -5,6 +5,7 @@ from passlib.context import CryptContext
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from models import content_fields
 
 load_dotenv()
 
@@ -121,6 +122,9 @@ def seed_news(user_ids):
         }
     ]
     
+    for article in news_articles:
+        article.update(content_fields(article.pop("content")))
+
     result = news_collection.insert_many(news_articles)
     print(f"✓ Inserted {len(result.inserted_ids)} news articles")
 